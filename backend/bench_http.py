@@ -0,0 +1,150 @@
+"""
+Microbenchmark for the shared HTTP clients against local stub servers.
+
+Starts stub Ollama (/api/embed) and Groq (/openai/v1/chat/completions) servers on
+localhost and sends the same requests three ways:
+    fresh      a new httpx.Client per request, so every request opens a connection
+    pooled     the shared keep-alive client from http_clients
+    embeddings a new OllamaEmbeddings per call (as before) versus the shared ollama_embeddings()
+
+The stubs speak plain HTTP/1.1, so TLS and HTTP/2 savings against the real Groq API
+come on top of what is measured here. --connect-delay adds a per-connection delay
+on the stub side to approximate the handshake cost of a remote server.
+
+Usage:
+    python bench_http.py --requests 200 --concurrency 8 --connect-delay 0.02
+"""
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+EMBED_RESPONSE = json.dumps({"model": "nomic-embed-text", "embeddings": [[0.1] * 768]}).encode()
+CHAT_RESPONSE = json.dumps({
+    "id": "chatcmpl-stub",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "qwen-qwq-32b",
+    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "ok"}}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections open between requests
+    disable_nagle_algorithm = True  # headers and body are separate writes
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = EMBED_RESPONSE if self.path.startswith("/api/") else CHAT_RESPONSE
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    connect_delay = 0.0
+
+    def finish_request(self, request, client_address):
+        # Charged once per connection, like a TCP/TLS handshake to a remote host
+        if self.connect_delay:
+            time.sleep(self.connect_delay)
+        super().finish_request(request, client_address)
+
+
+def start_stub(connect_delay):
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    server.connect_delay = connect_delay
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def _timed(send, requests, concurrency):
+    latencies = []
+
+    def _one(_):
+        started = time.perf_counter()
+        send()
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(_one, range(requests)))
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": requests,
+        "wall_seconds": wall,
+        "mean_ms": 1000 * statistics.mean(latencies),
+        "p50_ms": 1000 * latencies[len(latencies) // 2],
+        "p95_ms": 1000 * latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+def run(requests, concurrency, connect_delay):
+    server, base_url = start_stub(connect_delay)
+    # http_clients reads the Ollama URL at import time
+    os.environ["OLLAMA_BASE_URL"] = base_url
+    import http_clients
+    from langchain_ollama.embeddings import OllamaEmbeddings
+
+    targets = {
+        "ollama": ("/api/embed", {"model": "nomic-embed-text", "input": ["what is this company?"]}),
+        "groq": ("/openai/v1/chat/completions", {"model": "qwen-qwq-32b", "messages": [{"role": "user", "content": "hi"}]}),
+    }
+    report = {"concurrency": concurrency, "connect_delay_seconds": connect_delay}
+    try:
+        for service, (path, payload) in targets.items():
+            def fresh():
+                with httpx.Client(base_url=base_url) as client:
+                    client.post(path, json=payload).raise_for_status()
+
+            pooled_client = http_clients.get_sync_client(service)
+
+            def pooled():
+                pooled_client.post(base_url + path, json=payload).raise_for_status()
+
+            http_clients.reset_stats()
+            report[service] = {
+                "fresh": _timed(fresh, requests, concurrency),
+                "pooled": _timed(pooled, requests, concurrency),
+                "pooled_connections": http_clients.connection_stats()["services"].get(service),
+            }
+
+        # The embedding path as lookup_policy used to run it versus the shared instance
+        def new_embeddings_per_call():
+            OllamaEmbeddings(model="nomic-embed-text", base_url=base_url).embed_query("what is this company?")
+
+        shared = http_clients.ollama_embeddings()
+        http_clients.reset_stats()
+        report["embeddings"] = {
+            "new_per_call": _timed(new_embeddings_per_call, requests, concurrency),
+            "shared": _timed(lambda: shared.embed_query("what is this company?"), requests, concurrency),
+            "shared_connections": http_clients.connection_stats()["services"].get("ollama"),
+        }
+    finally:
+        http_clients.close_clients()
+        server.shutdown()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark pooled versus per-request HTTP clients.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--connect-delay", type=float, default=0.0,
+                        help="Seconds the stub waits on each new connection")
+    args = parser.parse_args()
+    print(json.dumps(run(args.requests, args.concurrency, args.connect_delay), indent=2))
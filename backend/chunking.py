@@ -0,0 +1,302 @@
+"""
+Chunking strategies for the ingestion pipeline.
+
+Web pages and PDFs are chunked independently, each with its own options:
+    extraction          "full" keeps all page text, "main_content" keeps <main>/<article> and drops nav, header, footer
+    remove_boilerplate  drop lines that repeat across many pages (menus, cookie banners, footers)
+    splitter            "characters" sizes chunks by characters, "tokens" by tokens
+    chunk_size, chunk_overlap
+and "dedup" drops identical chunks across all sources.
+
+Named presets live in CHUNKING_PRESETS. CHUNKING_STRATEGY selects one for both source types;
+WEB_CHUNKING and PDF_CHUNKING override it per source type.
+
+Compare presets on chunk count, index size and build time:
+    python chunking.py --strategies baseline clean tokens
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from collections import Counter
+
+from dotenv import load_dotenv
+from langchain_community.document_loaders import PyPDFLoader, WebBaseLoader
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+try:
+    import tiktoken
+except ImportError:  # token sizing falls back to a word count
+    tiktoken = None
+
+load_dotenv()
+
+CHUNKING_PRESETS = {
+    # What create_new_retriever always did: whole page text, 1000 character chunks
+    "baseline": {
+        "web": {"extraction": "full", "remove_boilerplate": False,
+                "splitter": "characters", "chunk_size": 1000, "chunk_overlap": 100},
+        "pdf": {"splitter": "characters", "chunk_size": 1000, "chunk_overlap": 100},
+        "dedup": False,
+    },
+    # Same chunk sizes, without navigation and repeated boilerplate
+    "clean": {
+        "web": {"extraction": "main_content", "remove_boilerplate": True,
+                "splitter": "characters", "chunk_size": 1000, "chunk_overlap": 100},
+        "pdf": {"splitter": "characters", "chunk_size": 1000, "chunk_overlap": 100},
+        "dedup": True,
+    },
+    # Clean text sized in tokens, which bounds prompt tokens per retrieved chunk
+    "tokens": {
+        "web": {"extraction": "main_content", "remove_boilerplate": True,
+                "splitter": "tokens", "chunk_size": 256, "chunk_overlap": 32},
+        "pdf": {"splitter": "tokens", "chunk_size": 256, "chunk_overlap": 32},
+        "dedup": True,
+    },
+}
+
+DEFAULT_CHUNKING_STRATEGY = "baseline"
+
+# A line is boilerplate if it shows up on at least this share of pages (and on 3 pages or more)
+BOILERPLATE_MIN_SHARE = 0.5
+
+# Tags that never hold page content
+NON_CONTENT_TAGS = ["script", "style", "noscript", "nav", "header", "footer", "aside", "form", "iframe", "svg"]
+
+
+# Loaded on first use: tiktoken downloads the BPE file the first time, which must not block startup
+_encoding = None
+_encoding_failed = tiktoken is None
+
+
+def count_tokens(text: str) -> int:
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            print(f"tiktoken unavailable, estimating tokens from words: {str(e)}")
+            _encoding_failed = True
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    # Rough estimate, about 0.75 words per token for English text
+    return int(len(text.split()) / 0.75)
+
+
+def resolve_chunking(web=None, pdf=None):
+    """
+    Combine the web options of one preset with the PDF options of another.
+
+    Defaults come from CHUNKING_STRATEGY, WEB_CHUNKING and PDF_CHUNKING, read at call
+    time so they do not depend on when .env was loaded.
+    """
+    strategy = os.getenv("CHUNKING_STRATEGY", DEFAULT_CHUNKING_STRATEGY)
+    web = web or os.getenv("WEB_CHUNKING", strategy)
+    pdf = pdf or os.getenv("PDF_CHUNKING", strategy)
+    for name in (web, pdf):
+        if name not in CHUNKING_PRESETS:
+            raise ValueError(f"Unknown chunking strategy {name!r}, choose from {sorted(CHUNKING_PRESETS)}")
+    return {
+        "web": CHUNKING_PRESETS[web]["web"],
+        "pdf": CHUNKING_PRESETS[pdf]["pdf"],
+        "dedup": CHUNKING_PRESETS[web]["dedup"] or CHUNKING_PRESETS[pdf]["dedup"],
+    }
+
+
+def scrape_pages(urls):
+    """Fetch and parse every URL once. Returns {url: BeautifulSoup}."""
+    return {url: WebBaseLoader(url).scrape() for url in urls}
+
+
+def _page_metadata(url, soup):
+    metadata = {"source": url}
+    if soup.find("title"):
+        metadata["title"] = soup.find("title").get_text()
+    if description := soup.find("meta", attrs={"name": "description"}):
+        metadata["description"] = description.get("content", "No description found.")
+    if html := soup.find("html"):
+        metadata["language"] = html.get("lang", "No language found.")
+    return metadata
+
+
+def _main_content_text(soup):
+    # Work on a copy so the same soup can be reused by other strategies
+    soup = type(soup)(str(soup), "html.parser")
+    for tag in soup(NON_CONTENT_TAGS):
+        tag.decompose()
+    root = soup.find("main") or soup.find("article") or soup.find(attrs={"role": "main"}) or soup.body or soup
+    text = root.get_text("\n")
+    lines = (re.sub(r"\s+", " ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def web_documents(soups, extraction="full"):
+    """Turn scraped pages into Documents using the given extraction mode."""
+    docs = []
+    for url, soup in soups.items():
+        if extraction == "main_content":
+            text = _main_content_text(soup)
+        elif extraction == "full":
+            text = soup.get_text()
+        else:
+            raise ValueError(f"Unknown extraction mode {extraction!r}")
+        docs.append(Document(page_content=text, metadata=_page_metadata(url, soup)))
+    return docs
+
+
+def pdf_documents(pdf_dir):
+    docs = []
+    for filename in os.listdir(pdf_dir):
+        if filename.lower().endswith(".pdf"):
+            loader = PyPDFLoader(os.path.join(pdf_dir, filename), mode="page")
+            docs.extend(loader.load())
+    return docs
+
+
+def remove_boilerplate(docs, min_share=BOILERPLATE_MIN_SHARE):
+    """Drop lines that repeat across many pages, such as menus and footers."""
+    if len(docs) < 3:
+        return docs
+    page_lines = [set(line.strip() for line in doc.page_content.splitlines() if line.strip()) for doc in docs]
+    counts = Counter(line for lines in page_lines for line in lines)
+    threshold = max(3, min_share * len(docs))
+    boilerplate = {line for line, count in counts.items() if count >= threshold}
+    cleaned = []
+    for doc in docs:
+        lines = [line for line in doc.page_content.splitlines() if line.strip() not in boilerplate]
+        cleaned.append(Document(page_content="\n".join(lines), metadata=doc.metadata))
+    return cleaned
+
+
+def make_splitter(options):
+    if options["splitter"] == "tokens":
+        length_function = count_tokens
+    elif options["splitter"] == "characters":
+        length_function = len
+    else:
+        raise ValueError(f"Unknown splitter {options['splitter']!r}")
+    return RecursiveCharacterTextSplitter(
+        chunk_size=options["chunk_size"],
+        chunk_overlap=options["chunk_overlap"],
+        length_function=length_function,
+        is_separator_regex=False,
+    )
+
+
+def dedup_chunks(chunks):
+    """Keep only the first occurrence of chunks whose normalized text is identical."""
+    seen = set()
+    unique = []
+    for chunk in chunks:
+        digest = hashlib.sha1(" ".join(chunk.page_content.split()).lower().encode()).hexdigest()
+        if digest not in seen:
+            seen.add(digest)
+            unique.append(chunk)
+    return unique
+
+
+def build_chunks(urls, pdf_dir="pdf", chunking=None, soups=None):
+    """
+    Load web pages and PDFs and split them using the given chunking options.
+
+    Args:
+        urls: List of URLs to fetch
+        pdf_dir: Folder containing the PDF documents
+        chunking: Options from resolve_chunking, defaults to the configured strategies
+        soups: Already scraped pages, to avoid fetching them again
+
+    Returns:
+        tuple[list[Document], dict]: The chunks and statistics about them
+    """
+    chunking = chunking or resolve_chunking()
+
+    # Load documents from web
+    print("Loading web pages...")
+    if soups is None:
+        soups = scrape_pages(urls)
+    web_docs = web_documents(soups, chunking["web"]["extraction"])
+    if chunking["web"].get("remove_boilerplate"):
+        web_docs = remove_boilerplate(web_docs)
+
+    # Load documents from PDF directory
+    print("Loading PDFs...")
+    pdf_docs = pdf_documents(pdf_dir)
+    print(f"Loaded {len(web_docs)} web docs and {len(pdf_docs)} PDF docs.")
+
+    chunks = make_splitter(chunking["web"]).split_documents(web_docs)
+    chunks += make_splitter(chunking["pdf"]).split_documents(pdf_docs)
+    before_dedup = len(chunks)
+    if chunking["dedup"]:
+        chunks = dedup_chunks(chunks)
+    print(f"Split into {len(chunks)} chunks.")
+
+    stats = {
+        "chunks": len(chunks),
+        "duplicates_removed": before_dedup - len(chunks),
+        "characters": sum(len(chunk.page_content) for chunk in chunks),
+        "tokens": sum(count_tokens(chunk.page_content) for chunk in chunks),
+    }
+    # Word-count estimates are not comparable with tiktoken counts across runs
+    stats["token_counting"] = "tiktoken" if _encoding is not None else "word_estimate"
+    stats["avg_chunk_tokens"] = stats["tokens"] / len(chunks) if chunks else 0
+    return chunks, stats
+
+
+def _directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(path)
+        for name in files
+    )
+
+
+def benchmark_strategies(strategies, urls, pdf_dir="pdf"):
+    """Build a throwaway index per strategy and report chunk count, index size and build time."""
+    from langembedding import LOOKUP_K, VectorStoreRetriever
+
+    soups = scrape_pages(urls)
+    report = {}
+    for name in strategies:
+        chunking = resolve_chunking(web=name, pdf=name)
+        started = time.perf_counter()
+        chunks, stats = build_chunks(urls, pdf_dir, chunking=chunking, soups=soups)
+        stats["chunk_seconds"] = time.perf_counter() - started
+
+        directory = tempfile.mkdtemp(prefix=f"chunking-{name}-")
+        try:
+            started = time.perf_counter()
+            retriever = VectorStoreRetriever.from_docs(chunks, persist_directory=directory)
+            stats["embed_seconds"] = time.perf_counter() - started
+            stats["index_bytes"] = _directory_size(directory)
+            retriever.retire()
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        stats["build_seconds"] = stats["chunk_seconds"] + stats["embed_seconds"]
+        # Tokens added to the prompt by one lookup_policy call
+        stats["prompt_tokens_per_lookup"] = stats["avg_chunk_tokens"] * LOOKUP_K
+        report[name] = stats
+    return report
+
+
+if __name__ == "__main__":
+    from langembedding import DEFAULT_URLS
+
+    parser = argparse.ArgumentParser(description="Compare chunking strategies.")
+    parser.add_argument("--strategies", nargs="+", default=sorted(CHUNKING_PRESETS),
+                        choices=sorted(CHUNKING_PRESETS))
+    parser.add_argument("--pdf-dir", default="pdf")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = benchmark_strategies(args.strategies, DEFAULT_URLS, args.pdf_dir)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
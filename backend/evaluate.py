@@ -0,0 +1,236 @@
+"""
+Batch evaluation of retrieval quality and latency over a JSONL question set.
+
+Each line of the question set is a JSON object:
+    {"question": "...", "expected_sources": ["https://manipaltechnologies.com/contact-us/"]}
+"id" is optional and defaults to the line number.
+
+Usage:
+    python evaluate.py eval_questions.jsonl --mode retrieval --k 5 --workers 8
+    python evaluate.py eval_questions.jsonl --mode e2e --workers 4 --output report.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import re
+import statistics
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import chunking
+import http_clients
+import langembedding
+import llm_cache
+
+SOURCE_PATTERN = re.compile(r"^Source: (\S+)", re.MULTILINE)
+
+
+def load_questions(path):
+    questions = []
+    with open(path) as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            questions.append({
+                "id": item.get("id", line_no),
+                "question": item["question"],
+                "expected_sources": item.get("expected_sources", []),
+            })
+    return questions
+
+
+def _normalize_url(url):
+    return url.strip().rstrip("/").lower()
+
+
+def hit_at_k(retrieved_sources, expected_sources, k):
+    """1.0 if any expected source is among the first k retrieved, None if nothing is expected."""
+    if not expected_sources:
+        return None
+    expected = {_normalize_url(url) for url in expected_sources}
+    return float(any(_normalize_url(url) in expected for url in retrieved_sources[:k]))
+
+
+def run_retrieval(item, k):
+    with langembedding.live_retriever() as retriever:
+        started = time.perf_counter()
+        docs = retriever.query(item["question"], k=k)
+        latency = time.perf_counter() - started
+    sources = [doc["metadata"].get("source", "") for doc in docs]
+    return {
+        "latency_seconds": latency,
+        "sources": sources,
+        f"hit@{k}": hit_at_k(sources, item["expected_sources"], k),
+    }
+
+
+def run_end_to_end(item, k):
+    import groqs
+    from langchain_core.messages import AIMessage, ToolMessage
+
+    config = {
+        "configurable": {
+            "passenger_id": "evaluation",
+            "thread_id": str(uuid.uuid4()),
+        }
+    }
+    started = time.perf_counter()
+    state = groqs.part_1_graph.invoke({"messages": ("user", item["question"])}, config)
+    latency = time.perf_counter() - started
+
+    tool_calls = 0
+    injected_tool_calls = 0
+    llm_cache_hits = 0
+    input_tokens = 0
+    output_tokens = 0
+    sources = []
+    answer = ""
+    for message in state["messages"]:
+        if isinstance(message, AIMessage):
+            # SPECULATIVE_MODE=inject adds lookups the model never asked for
+            injected = sum((call["id"] or "").startswith(groqs.INJECTED_TOOL_CALL_PREFIX) for call in message.tool_calls)
+            injected_tool_calls += injected
+            tool_calls += len(message.tool_calls) - injected
+            llm_cache_hits += bool(message.response_metadata.get("llm_cache_hit"))
+            usage = message.usage_metadata or {}
+            input_tokens += usage.get("input_tokens", 0)
+            output_tokens += usage.get("output_tokens", 0)
+            answer = message.content
+        elif isinstance(message, ToolMessage):
+            sources.extend(SOURCE_PATTERN.findall(str(message.content)))
+    return {
+        "latency_seconds": latency,
+        "tool_calls": tool_calls,
+        "injected_tool_calls": injected_tool_calls,
+        "llm_cache_hits": llm_cache_hits,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "sources": sources,
+        f"hit@{k}": hit_at_k(sources, item["expected_sources"], k),
+        "answer": answer,
+    }
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(results, k):
+    ok = [r for r in results if "error" not in r]
+    latencies = [r["latency_seconds"] for r in ok]
+    hits = [r[f"hit@{k}"] for r in ok if r.get(f"hit@{k}") is not None]
+    summary = {
+        "questions": len(results),
+        "errors": len(results) - len(ok),
+        f"hit@{k}": sum(hits) / len(hits) if hits else None,
+        "scored_questions": len(hits),
+    }
+    if latencies:
+        summary.update({
+            "latency_mean_seconds": statistics.mean(latencies),
+            "latency_p50_seconds": _percentile(latencies, 50),
+            "latency_p95_seconds": _percentile(latencies, 95),
+            "latency_max_seconds": max(latencies),
+        })
+    if ok and "tool_calls" in ok[0]:
+        summary.update({
+            "tool_calls_mean": statistics.mean(r["tool_calls"] for r in ok),
+            "injected_tool_calls": sum(r["injected_tool_calls"] for r in ok),
+            "llm_cache_hits": sum(r["llm_cache_hits"] for r in ok),
+            "input_tokens_total": sum(r["input_tokens"] for r in ok),
+            "output_tokens_total": sum(r["output_tokens"] for r in ok),
+        })
+    return summary
+
+
+def evaluate(questions, mode="retrieval", k=langembedding.LOOKUP_K, workers=4):
+    """
+    Run every question through the chosen mode and return a report dict.
+
+    In e2e mode each lookup retrieves LOOKUP_K chunks, so k must equal LOOKUP_K there.
+    """
+    if mode == "e2e" and k != langembedding.LOOKUP_K:
+        raise ValueError(f"e2e mode measures hit@{langembedding.LOOKUP_K}, the chunks lookup_policy retrieves")
+    run = run_retrieval if mode == "retrieval" else run_end_to_end
+    # Load the index once up front so its build time is not charged to the first question
+    with langembedding.live_retriever():
+        pass
+
+    def _run(item):
+        result = {"id": item["id"], "question": item["question"]}
+        try:
+            result.update(run(item, k))
+        except Exception as e:
+            result["error"] = repr(e)
+        return result
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_run, questions))
+    wall_time = time.perf_counter() - started
+
+    summary = summarize(results, k)
+    summary["wall_time_seconds"] = wall_time
+    summary["throughput_qps"] = len(results) / wall_time if wall_time else None
+    strategy = os.getenv("CHUNKING_STRATEGY", chunking.DEFAULT_CHUNKING_STRATEGY)
+    return {
+        "config": {
+            "mode": mode,
+            "k": k,
+            "workers": workers,
+            "index_directory": langembedding.index_status()["live_directory"],
+            # Settings the numbers depend on, so reports from different runs can be compared
+            "chunking": {
+                "web": os.getenv("WEB_CHUNKING", strategy),
+                "pdf": os.getenv("PDF_CHUNKING", strategy),
+                "options": chunking.resolve_chunking(),
+            },
+            "embedding_model": http_clients.EMBEDDING_MODEL,
+            "speculative_mode": os.getenv("SPECULATIVE_MODE", "off").lower(),
+            "llm_cache_mode": llm_cache.LLM_CACHE_MODE,
+            "timestamp": datetime.now().isoformat(),
+        },
+        "summary": summary,
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate retrieval quality and latency over a question set.")
+    parser.add_argument("questions", help="JSONL file with one question per line")
+    parser.add_argument("--mode", choices=["retrieval", "e2e"], default="retrieval",
+                        help="retrieval: query the index only; e2e: run the full assistant graph")
+    parser.add_argument("--k", type=int,
+                        help=f"Number of chunks retrieved and used for hit@k, retrieval mode only "
+                             f"(default {langembedding.LOOKUP_K}; e2e always uses lookup_policy's {langembedding.LOOKUP_K})")
+    parser.add_argument("--workers", type=int, default=4, help="Number of questions run concurrently")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+    if args.k is not None and args.mode == "e2e":
+        parser.error("--k only applies to --mode retrieval; lookup_policy always retrieves "
+                     f"{langembedding.LOOKUP_K} chunks per call")
+    k = args.k if args.k is not None else langembedding.LOOKUP_K
+
+    # Progress output from index loading goes to stderr so stdout stays valid JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        report = evaluate(load_questions(args.questions), mode=args.mode, k=k, workers=args.workers)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(json.dumps(report["summary"], indent=2), file=sys.stderr)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from langchain_core.messages import ToolMessage
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
 from langchain_core.runnables import RunnableLambda
 from langgraph.prebuilt import ToolNode
 from langchain_core.prompts import ChatPromptTemplate
@@ -12,8 +12,17 @@ from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import END, StateGraph, START
 from langgraph.prebuilt import tools_condition
 from langchain_groq import ChatGroq
+from langchain_core.tools import StructuredTool
+from concurrent.futures import ThreadPoolExecutor
+import os
+import re
+import threading
+import time
 import uuid
 from langembedding import lookup_policy  # Import from the embedding module
+from http_clients import groq_http_clients
+from llm_cache import LLM_CACHE_MODE, cached_tool_decisions
+from langembedding import LOOKUP_K, format_retrieved_docs, live_retriever
 from datetime import datetime
 from langchain_core.prompts import ChatPromptTemplate
 class State(TypedDict):
@@ -52,13 +61,152 @@ def _print_event(event: dict, _printed: set, max_length=1500):
             print(msg_repr)
             _printed.add(message.id)
 
+# Speculative retrieval runs lookup_policy on the raw user message while Groq decides on a tool call.
+#   off    - disabled
+#   reuse  - the tools node reuses the speculative result when the model's query matches the user message
+#   inject - the retrieved context is added before the first Groq call, skipping the first tool round-trip.
+#            The assistant waits for the retrieval before calling Groq, and every first turn carries a
+#            lookup_policy exchange, greetings and off-topic questions included, which costs extra
+#            prompt tokens. It pays off when most questions need a lookup anyway.
+SPECULATIVE_MODE = os.getenv("SPECULATIVE_MODE", "off").lower()
+# Share of the model's query terms that must appear in the user message for a reuse hit
+SPECULATIVE_MATCH_THRESHOLD = float(os.getenv("SPECULATIVE_MATCH_THRESHOLD", "0.6"))
+# Speculations never consumed (e.g. a failed request) are dropped after this many seconds
+SPECULATION_TTL = 300
+# Id prefix of the lookup_policy calls inject mode adds, which the model never made
+INJECTED_TOOL_CALL_PREFIX = "speculative_"
+
+_speculation_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative-retrieval")
+_speculations = {}  # thread_id -> Speculation
+_speculation_lock = threading.Lock()
+_speculation_stats = {
+    "started": 0, "hits": 0, "misses": 0, "unused": 0, "saved_seconds": 0.0,
+    "injected": 0, "inject_saved_seconds": 0.0,
+}
+
+class Speculation:
+    def __init__(self, query: str):
+        self.query = query
+        self.started = time.perf_counter()
+        self.finished = None
+        self.future = _speculation_pool.submit(self._retrieve)
+
+    def _retrieve(self):
+        try:
+            with live_retriever() as retriever:
+                return retriever.query(self.query, k=LOOKUP_K)
+        finally:
+            self.finished = time.perf_counter()
+
+def _tokens(text: str) -> set:
+    return set(re.findall(r"\w+", text.lower()))
+
+def _query_match(user_message: str, tool_query: str) -> float:
+    """Fraction of the tool query's terms that also appear in the user message."""
+    tool_terms = _tokens(tool_query)
+    if not tool_terms:
+        return 0.0
+    return len(tool_terms & _tokens(user_message)) / len(tool_terms)
+
+def start_speculation(thread_id: str, user_message: str):
+    now = time.perf_counter()
+    with _speculation_lock:
+        for key in [k for k, v in _speculations.items() if now - v.started > SPECULATION_TTL]:
+            del _speculations[key]
+        _speculations[thread_id] = Speculation(user_message)
+        _speculation_stats["started"] += 1
+
+def _take_speculation(thread_id: str):
+    with _speculation_lock:
+        return _speculations.pop(thread_id, None)
+
+def discard_speculation(thread_id: str):
+    """Drop a speculation the model never asked for."""
+    if _take_speculation(thread_id) is not None:
+        with _speculation_lock:
+            _speculation_stats["unused"] += 1
+
+def speculation_stats() -> dict:
+    with _speculation_lock:
+        stats = dict(_speculation_stats)
+    decided = stats["hits"] + stats["misses"]
+    stats["mode"] = SPECULATIVE_MODE
+    stats["hit_rate"] = stats["hits"] / decided if decided else 0.0
+    stats["avg_saved_ms"] = 1000 * stats["saved_seconds"] / stats["hits"] if stats["hits"] else 0.0
+    stats["avg_inject_saved_ms"] = (
+        1000 * stats["inject_saved_seconds"] / stats["injected"] if stats["injected"] else 0.0
+    )
+    return stats
+
+def _record_hit(speculation: Speculation, waited: float):
+    # Latency saved is the part of the retrieval that overlapped with the Groq call
+    retrieval_time = speculation.finished - speculation.started
+    with _speculation_lock:
+        _speculation_stats["hits"] += 1
+        _speculation_stats["saved_seconds"] += max(0.0, retrieval_time - waited)
+
+def _speculative_lookup(query: str, config: RunnableConfig) -> str:
+    thread_id = config.get("configurable", {}).get("thread_id")
+    speculation = _take_speculation(thread_id) if thread_id else None
+    if speculation is not None:
+        if _query_match(speculation.query, query) >= SPECULATIVE_MATCH_THRESHOLD:
+            waited_from = time.perf_counter()
+            try:
+                retrieved_docs = speculation.future.result()
+            except Exception as e:
+                print(f"Speculative retrieval failed: {str(e)}")
+            else:
+                _record_hit(speculation, time.perf_counter() - waited_from)
+                return format_retrieved_docs(retrieved_docs)
+        with _speculation_lock:
+            _speculation_stats["misses"] += 1
+    return lookup_policy.func(query)
+
+# Same name, description and arguments as lookup_policy, so the model sees no difference
+speculative_lookup_policy = StructuredTool.from_function(
+    func=_speculative_lookup,
+    name=lookup_policy.name,
+    description=lookup_policy.description,
+    args_schema=lookup_policy.args_schema,
+)
+
+def _injected_lookup(speculation: Speculation) -> list:
+    """Turn a finished speculation into a lookup_policy call and its result."""
+    try:
+        content = format_retrieved_docs(speculation.future.result())
+    except Exception as e:
+        print(f"Speculative retrieval failed: {str(e)}")
+        return []
+    # The tools node no longer runs this retrieval; the skipped second Groq call comes on top
+    with _speculation_lock:
+        _speculation_stats["injected"] += 1
+        _speculation_stats["inject_saved_seconds"] += speculation.finished - speculation.started
+    tool_call_id = f"{INJECTED_TOOL_CALL_PREFIX}{uuid.uuid4().hex}"
+    return [
+        AIMessage(
+            content="",
+            tool_calls=[{"name": lookup_policy.name, "args": {"query": speculation.query}, "id": tool_call_id}],
+        ),
+        ToolMessage(content=content, tool_call_id=tool_call_id),
+    ]
+
 class Assistant:
     def __init__(self, runnable: Runnable):
         self.runnable = runnable
 
     def __call__(self, state: State, config: RunnableConfig):
+        configuration = config.get("configurable", {})
+        thread_id = configuration.get("thread_id")
+        injected = []
+        last_message = state["messages"][-1]
+        if SPECULATIVE_MODE in ("reuse", "inject") and thread_id and isinstance(last_message, HumanMessage):
+            start_speculation(thread_id, last_message.content)
+            if SPECULATIVE_MODE == "inject":
+                speculation = _take_speculation(thread_id)
+                speculation.future.exception()  # wait for the retrieval to finish
+                injected = _injected_lookup(speculation)
+                state = {**state, "messages": state["messages"] + injected}
         while True:
-            configuration = config.get("configurable", {})
             passenger_id = configuration.get("passenger_id", None)
             state = {**state, "user_info": passenger_id}
             result = self.runnable.invoke(state)
@@ -73,13 +221,17 @@ class Assistant:
                 state = {**state, "messages": messages}
             else:
                 break
-        return {"messages": result}
+        if not result.tool_calls and thread_id:
+            discard_speculation(thread_id)
+        return {"messages": injected + [result]}
 
 # Using Groq model with the provided API key
+# Requests go through the shared keep-alive Groq clients from http_clients
 llm = ChatGroq(
     model="qwen-qwq-32b",
     temperature=0.7,
-    max_tokens=2400
+    max_tokens=2400,
+    **groq_http_clients()
 )
 primary_assistant_prompt = ChatPromptTemplate.from_messages(
     [
@@ -107,9 +259,17 @@ primary_assistant_prompt = ChatPromptTemplate.from_messages(
     ]
 ).partial(time=datetime.now())
 part_1_tools = [
-    lookup_policy,
+    speculative_lookup_policy if SPECULATIVE_MODE == "reuse" else lookup_policy,
 ]
-part_1_assistant_runnable = primary_assistant_prompt | llm.bind_tools(part_1_tools)
+# First-turn tool decisions can be served from the LLM cache (LLM_CACHE_MODE)
+if SPECULATIVE_MODE == "inject" and LLM_CACHE_MODE != "off":
+    print(f"LLM_CACHE_MODE={LLM_CACHE_MODE} has no effect with SPECULATIVE_MODE=inject: "
+          "the first lookup is injected, so there is no first-turn tool decision to cache")
+part_1_assistant_runnable = cached_tool_decisions(
+    primary_assistant_prompt,
+    llm.bind_tools(part_1_tools),
+    {"model": llm.model_name, "temperature": llm.temperature, "max_tokens": llm.max_tokens},
+)
 
 builder = StateGraph(State)
 
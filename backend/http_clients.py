@@ -0,0 +1,230 @@
+"""
+Shared outbound HTTP clients for the Ollama embedding server and the Groq API.
+
+Every service gets one keep-alive connection pool per process, shared by all
+calls, with sync and async variants. Pool sizes and timeouts are read from the
+environment, per service (OLLAMA_*, GROQ_*) with HTTP_* as the fallback:
+    *_HTTP_MAX_CONNECTIONS     total connections in the pool (default 20)
+    *_HTTP_MAX_KEEPALIVE       idle connections kept open (default 10)
+    *_HTTP_KEEPALIVE_EXPIRY    seconds an idle connection is kept (default 30)
+    *_HTTP_CONNECT_TIMEOUT     seconds (default 5)
+    *_HTTP_READ_TIMEOUT        seconds (default 60)
+HTTP/2 is used when the `h2` package is installed and the server negotiates it;
+set HTTP2=0 to turn it off. The Ollama server is OLLAMA_BASE_URL if set, otherwise
+OLLAMA_HOST as with a plain OllamaEmbeddings.
+
+connection_stats() reports requests, new connections and reuse per service.
+"""
+import os
+import threading
+
+import httpx
+from dotenv import load_dotenv
+from langchain_ollama.embeddings import OllamaEmbeddings
+
+try:
+    import h2  # noqa: F401  # needed by httpx for HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+load_dotenv()
+
+HTTP2_ENABLED = HTTP2_AVAILABLE and os.getenv("HTTP2", "1") != "0"
+# Unset leaves the choice to the ollama client, which honours OLLAMA_HOST and defaults to localhost
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL")
+EMBEDDING_MODEL = "nomic-embed-text"
+
+_lock = threading.Lock()
+_sync_transports = {}
+_async_transports = {}
+_sync_clients = {}
+_async_clients = {}
+_embeddings = {}
+_stats = {}
+
+
+def _setting(service, name, default):
+    return float(os.getenv(f"{service.upper()}_HTTP_{name}", os.getenv(f"HTTP_{name}", default)))
+
+
+def pool_limits(service):
+    return httpx.Limits(
+        max_connections=int(_setting(service, "MAX_CONNECTIONS", 20)),
+        max_keepalive_connections=int(_setting(service, "MAX_KEEPALIVE", 10)),
+        keepalive_expiry=_setting(service, "KEEPALIVE_EXPIRY", 30),
+    )
+
+
+def pool_timeout(service):
+    read = _setting(service, "READ_TIMEOUT", 60)
+    return httpx.Timeout(read, connect=_setting(service, "CONNECT_TIMEOUT", 5))
+
+
+class _RequestTrace:
+    """Collects httpcore trace events for one request."""
+
+    def __init__(self):
+        self.new_connection = False
+        self.tls_handshake = False
+        self.http2 = False
+
+    def __call__(self, event_name, info):
+        if event_name == "connection.connect_tcp.started":
+            self.new_connection = True
+        elif event_name == "connection.start_tls.started":
+            self.tls_handshake = True
+        elif event_name.startswith("http2."):
+            self.http2 = True
+
+
+class _AsyncRequestTrace(_RequestTrace):
+    async def __call__(self, event_name, info):
+        super().__call__(event_name, info)
+
+
+def _record(service, trace):
+    with _lock:
+        stats = _stats.setdefault(service, {
+            "requests": 0, "new_connections": 0, "tls_handshakes": 0, "http2_requests": 0,
+        })
+        stats["requests"] += 1
+        stats["new_connections"] += trace.new_connection
+        stats["tls_handshakes"] += trace.tls_handshake
+        stats["http2_requests"] += trace.http2
+
+
+class CountingTransport(httpx.HTTPTransport):
+    """Pooled transport that records whether each request opened a new connection."""
+
+    def __init__(self, service, **kwargs):
+        super().__init__(**kwargs)
+        self.service = service
+
+    def handle_request(self, request):
+        trace = _RequestTrace()
+        request.extensions["trace"] = trace
+        try:
+            return super().handle_request(request)
+        finally:
+            _record(self.service, trace)
+
+
+class AsyncCountingTransport(httpx.AsyncHTTPTransport):
+    """Async variant of CountingTransport."""
+
+    def __init__(self, service, **kwargs):
+        super().__init__(**kwargs)
+        self.service = service
+
+    async def handle_async_request(self, request):
+        trace = _AsyncRequestTrace()
+        request.extensions["trace"] = trace
+        try:
+            return await super().handle_async_request(request)
+        finally:
+            _record(self.service, trace)
+
+
+def sync_transport(service):
+    """Shared pooled transport for a service; every sync client of that service sends through it."""
+    with _lock:
+        if service not in _sync_transports:
+            _sync_transports[service] = CountingTransport(
+                service, limits=pool_limits(service), http2=HTTP2_ENABLED
+            )
+        return _sync_transports[service]
+
+
+def async_transport(service):
+    """Async variant of sync_transport."""
+    with _lock:
+        if service not in _async_transports:
+            _async_transports[service] = AsyncCountingTransport(
+                service, limits=pool_limits(service), http2=HTTP2_ENABLED
+            )
+        return _async_transports[service]
+
+
+def get_sync_client(service):
+    """Shared keep-alive httpx.Client for a service."""
+    transport = sync_transport(service)
+    with _lock:
+        if service not in _sync_clients:
+            _sync_clients[service] = httpx.Client(transport=transport, timeout=pool_timeout(service))
+        return _sync_clients[service]
+
+
+def get_async_client(service):
+    """Shared keep-alive httpx.AsyncClient for a service."""
+    transport = async_transport(service)
+    with _lock:
+        if service not in _async_clients:
+            _async_clients[service] = httpx.AsyncClient(transport=transport, timeout=pool_timeout(service))
+        return _async_clients[service]
+
+
+def ollama_embeddings(model=EMBEDDING_MODEL):
+    """
+    Shared OllamaEmbeddings instance whose requests go through the pooled Ollama transports.
+
+    The ollama client builds its own httpx clients, so the pooled transports are handed to it
+    instead; connections are still shared with every other Ollama caller in the process.
+    """
+    with _lock:
+        embeddings = _embeddings.get(model)
+    if embeddings is None:
+        embeddings = OllamaEmbeddings(
+            model=model,
+            base_url=OLLAMA_BASE_URL,
+            client_kwargs={"timeout": pool_timeout("ollama")},
+            sync_client_kwargs={"transport": sync_transport("ollama")},
+            async_client_kwargs={"transport": async_transport("ollama")},
+        )
+        with _lock:
+            embeddings = _embeddings.setdefault(model, embeddings)
+    return embeddings
+
+
+def groq_http_clients():
+    """Keyword arguments that make ChatGroq use the shared Groq clients."""
+    return {
+        "http_client": get_sync_client("groq"),
+        "http_async_client": get_async_client("groq"),
+    }
+
+
+def connection_stats():
+    """Requests, new connections and reuse ratio per service since startup."""
+    with _lock:
+        stats = {service: dict(values) for service, values in _stats.items()}
+    for values in stats.values():
+        values["reused_connections"] = values["requests"] - values["new_connections"]
+        values["reuse_ratio"] = values["reused_connections"] / values["requests"] if values["requests"] else 0.0
+    return {"http2_enabled": HTTP2_ENABLED, "services": stats}
+
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
+
+
+def close_clients():
+    """Close the sync pools. Async pools are closed by aclose_clients."""
+    with _lock:
+        transports = list(_sync_transports.values())
+        _sync_transports.clear()
+        _sync_clients.clear()
+        _embeddings.clear()
+    for transport in transports:
+        transport.close()
+
+
+async def aclose_clients():
+    with _lock:
+        transports = list(_async_transports.values())
+        _async_transports.clear()
+        _async_clients.clear()
+    for transport in transports:
+        await transport.aclose()
+    close_clients()
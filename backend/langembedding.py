@@ -2,15 +2,23 @@ import re
 import numpy as np
 import requests
 from langchain_core.tools import tool
-from langchain_ollama.embeddings import OllamaEmbeddings
-from langchain_community.document_loaders import WebBaseLoader
 from langchain_community.vectorstores import Chroma
 from langchain_core.documents import Document
+from contextlib import contextmanager
 import os
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader
+import shutil
+import threading
+import time
+import uuid
+from chunking import build_chunks
+from http_clients import ollama_embeddings
 from dotenv import load_dotenv
 
+try:
+    import fcntl
+except ImportError:  # Windows: refreshes are only coordinated within one process
+    fcntl = None
+
 
 
 load_dotenv()
@@ -20,35 +28,61 @@ api_key = os.getenv("GROQ_API_KEY")
 os.environ["GROQ_API_KEY"] = api_key
 
 # Define path for storing ChromaDB
+# Legacy single-directory index, still served until the first versioned build is published
 CHROMA_PERSIST_DIRECTORY = "chroma_store2"
 COLLECTION_NAME = "mtl_documents"
 
+# Versioned indexes live under INDEX_ROOT, one directory per build.
+# The CURRENT file holds the name of the live version and is swapped atomically.
+INDEX_ROOT = os.getenv("INDEX_ROOT", "chroma_indexes")
+CURRENT_POINTER = os.path.join(INDEX_ROOT, "CURRENT")
+REFRESH_LOCK = os.path.join(INDEX_ROOT, ".refresh.lock")
+# Holds the PID of the worker building a version, for anyone asking whether a build is running
+REFRESH_MARKER = os.path.join(INDEX_ROOT, ".refresh.building")
+# Number of versions kept on disk (live one included) so in-flight queries can finish
+INDEX_KEEP_VERSIONS = max(2, int(os.getenv("INDEX_KEEP_VERSIONS", "2")))
+# After a failed inline build, requests fail fast for this many seconds instead of rebuilding again
+INLINE_BUILD_BACKOFF = int(os.getenv("INDEX_INLINE_BUILD_BACKOFF", "300"))
+
 class VectorStoreRetriever:
     def __init__(self, chroma_db):
         self._chroma_db = chroma_db
+        # Leases and queries holding the retriever right now, so a retired retriever
+        # is only closed once they are done with it
+        self._active_queries = 0
+        self._retired = False
+        self._closed = False
+        self._state_lock = threading.Lock()
     
     @classmethod
-    def from_docs(cls, docs):
-        # Initialize embedding model
-        embed_model = OllamaEmbeddings(model="nomic-embed-text")
+    def from_docs(cls, docs, persist_directory=CHROMA_PERSIST_DIRECTORY):
+        # Shared embedding model with a pooled keep-alive connection to Ollama
+        embed_model = ollama_embeddings()
         
         # Create a new ChromaDB instance
         db = Chroma.from_documents(
             documents=docs,
             embedding=embed_model,
             collection_name=COLLECTION_NAME,
-            persist_directory=CHROMA_PERSIST_DIRECTORY
+            persist_directory=persist_directory
         )
         
         # Persist to disk
         db.persist()
-        print(f"Created and saved vector store to {CHROMA_PERSIST_DIRECTORY}")
+        print(f"Created and saved vector store to {persist_directory}")
         
         return cls(db)
     
     def query(self, query: str, k: int = 5) -> list[dict]:
-        # Query ChromaDB and format results to match your original format
-        results = self._chroma_db.similarity_search_with_relevance_scores(query, k=k)
+        with self._state_lock:
+            if self._closed:
+                raise RuntimeError("Retriever was closed; take a new one from live_retriever()")
+            self._active_queries += 1
+        try:
+            # Query ChromaDB and format results to match your original format
+            results = self._chroma_db.similarity_search_with_relevance_scores(query, k=k)
+        finally:
+            self.release()
         
         return [
             {
@@ -59,120 +93,452 @@ class VectorStoreRetriever:
             for doc, score in results
         ]
 
+    def acquire(self):
+        """
+        Keep the retriever open until the matching release(), even if it is retired meanwhile.
+
+        Returns:
+            bool: False if the retriever was already retired and must not be used
+        """
+        with self._state_lock:
+            if self._retired:
+                return False
+            self._active_queries += 1
+        return True
+
+    def release(self):
+        with self._state_lock:
+            self._active_queries -= 1
+            close = self._retired and self._active_queries == 0 and not self._closed
+            self._closed = self._closed or close
+        if close:
+            self._close()
+
+    def retire(self):
+        """Close the underlying Chroma client once every lease and query has finished."""
+        with self._state_lock:
+            self._retired = True
+            close = self._active_queries == 0 and not self._closed
+            self._closed = self._closed or close
+        if close:
+            self._close()
+
+    def _close(self):
+        # Releases the SQLite handles and HNSW segments of this directory once no other
+        # client uses it, so a garbage-collected version actually frees its disk space
+        self._chroma_db._client.close()
+
+# Company pages embedded into the index
+DEFAULT_URLS = [
+    "https://manipaltechnologies.com/",
+    "https://manipaltechnologies.com/about-us/",
+    "https://manipaltechnologies.com/careers/",
+    "https://manipaltechnologies.com/contact-us/",
+    "https://manipaltechnologies.com/blogs/",
+    "https://manipaltechnologies.com/videos/",
+    "https://manipaltechnologies.com/events/",
+    "https://manipaltechnologies.com/downloads/",
+    "https://manipaltechnologies.com/bfsi/sahibnk/",
+    "https://manipaltechnologies.com/bfsi/digital-banking-smart-branches-solutions/",
+    "https://manipaltechnologies.com/bfsi/crossfraud-suite/",
+    "https://manipaltechnologies.com/bfsi/payment-solutions/",
+    "https://manipaltechnologies.com/bfsi/card-management/",
+    "https://manipaltechnologies.com/bfsi/secure-print-solution/",
+    "https://manipaltechnologies.com/bfsi/financial-inclusion-solution/",
+    "https://manipaltechnologies.com/bfsi/branding-communication/",
+    "https://manipaltechnologies.com/bfsi/pms/",
+    "https://manipaltechnologies.com/bfsi/corporate/",
+    "https://manipaltechnologies.com/government/",
+    "https://manipaltechnologies.com/publishing/",
+    "https://manipaltechnologies.com/retail/",
+    "https://www.linkedin.com/company/manipal-technologies-limited/",
+    "https://manipaltechnologies.com/who-we-are/",
+    "https://manipaltechnologies.com/who-we-are/team",
+]
+
 def create_new_retriever(
     urls=None,
     pdf_dir="pdf",# Replace this with your main folder name; insted which all the pdf documents are presents
-    embed_model=None
+    embed_model=None,
+    persist_directory=CHROMA_PERSIST_DIRECTORY,
+    chunking=None
 ):
     """Creates a unified retriever using web pages and PDFs"""
     
     if embed_model is None:
-        embed_model = OllamaEmbeddings(model="nomic-embed-text")
+        embed_model = ollama_embeddings()
     
     # Default URLs if none provided
     if urls is None:
-        urls = [
-            "https://manipaltechnologies.com/",
-            "https://manipaltechnologies.com/about-us/",
-            "https://manipaltechnologies.com/careers/",
-            "https://manipaltechnologies.com/contact-us/",
-            "https://manipaltechnologies.com/blogs/",
-            "https://manipaltechnologies.com/videos/",
-            "https://manipaltechnologies.com/events/",
-            "https://manipaltechnologies.com/downloads/",
-            "https://manipaltechnologies.com/bfsi/sahibnk/",
-            "https://manipaltechnologies.com/bfsi/digital-banking-smart-branches-solutions/",
-            "https://manipaltechnologies.com/bfsi/crossfraud-suite/",
-            "https://manipaltechnologies.com/bfsi/payment-solutions/",
-            "https://manipaltechnologies.com/bfsi/card-management/",
-            "https://manipaltechnologies.com/bfsi/secure-print-solution/",
-            "https://manipaltechnologies.com/bfsi/financial-inclusion-solution/",
-            "https://manipaltechnologies.com/bfsi/branding-communication/",
-            "https://manipaltechnologies.com/bfsi/pms/",
-            "https://manipaltechnologies.com/bfsi/corporate/",
-            "https://manipaltechnologies.com/government/",
-            "https://manipaltechnologies.com/publishing/",
-            "https://manipaltechnologies.com/retail/",
-            "https://www.linkedin.com/company/manipal-technologies-limited/",
-            "https://manipaltechnologies.com/who-we-are/",
-            "https://manipaltechnologies.com/who-we-are/team",
-        ]
-    
-    # Load documents from web
-    print("Loading web pages...")
-    web_loader = WebBaseLoader(urls)
-    web_docs = web_loader.load()
+        urls = DEFAULT_URLS
     
-    # Load documents from PDF directory
-    print("Loading PDFs...")
-    pdf_docs = []
-    for filename in os.listdir(pdf_dir):
-        if filename.lower().endswith(".pdf"):
-            loader = PyPDFLoader(os.path.join(pdf_dir, filename), mode="page")
-            pdf_docs.extend(loader.load())
-
-    print(f"Loaded {len(web_docs)} web docs and {len(pdf_docs)} PDF docs.")
-
-    # Combine all docs
-    all_docs = web_docs + pdf_docs
-
-    # Split documents
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=100,
-        length_function=len,
-        is_separator_regex=False,
-    )
-    split_docs = text_splitter.split_documents(all_docs)
-    print(f"Split into {len(split_docs)} chunks.")
+    # Load and split web pages and PDFs with the configured chunking strategies
+    split_docs, stats = build_chunks(urls, pdf_dir, chunking=chunking)
+    print(f"Chunking stats: {stats}")
 
     # Create and return retriever
-    return VectorStoreRetriever.from_docs(split_docs)
+    return VectorStoreRetriever.from_docs(split_docs, persist_directory=persist_directory)
+
+def _read_current_version():
+    """Return the name of the live index version, or None if none was published yet."""
+    try:
+        with open(CURRENT_POINTER) as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return version or None
+
+
+def _live_index_directory():
+    """Directory of the index that queries should be served from right now."""
+    version = _read_current_version()
+    if version is not None:
+        return os.path.join(INDEX_ROOT, version)
+    if os.path.exists(CHROMA_PERSIST_DIRECTORY):
+        return CHROMA_PERSIST_DIRECTORY
+    return None
+
 
-def get_or_create_retriever(urls=None):
+def _publish_version(version):
+    """Atomically point CURRENT at a freshly built version."""
+    tmp_pointer = f"{CURRENT_POINTER}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_pointer, "w") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    # os.replace is atomic, so every worker sees either the old or the new version
+    os.replace(tmp_pointer, CURRENT_POINTER)
+
+
+# Stands in for the flock where fcntl is missing
+_local_refresh_lock = threading.Lock()
+
+
+def _acquire_refresh_lock():
     """
-    Check if Chroma collection exists and load it, otherwise create a new one.
-    
+    Take the cross-process refresh lock and write REFRESH_MARKER.
+
+    The lock is an flock on REFRESH_LOCK, which the kernel drops when the holder exits,
+    so a crashed build never leaves a stale lock behind. Without fcntl (Windows) it is
+    a lock within this process only, so run a single worker there.
+
+    Returns:
+        The open lock file to pass to _release_refresh_lock, or None if another build holds it
+    """
+    os.makedirs(INDEX_ROOT, exist_ok=True)
+    lock_file = open(REFRESH_LOCK, "a")
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        elif not _local_refresh_lock.acquire(blocking=False):
+            raise BlockingIOError
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    tmp_marker = f"{REFRESH_MARKER}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_marker, "w") as f:
+        f.write(str(os.getpid()))
+    os.replace(tmp_marker, REFRESH_MARKER)
+    return lock_file
+
+
+def _release_refresh_lock(lock_file):
+    try:
+        os.remove(REFRESH_MARKER)
+    except FileNotFoundError:
+        pass
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+    else:
+        _local_refresh_lock.release()
+    lock_file.close()
+
+
+def _process_alive(pid):
+    if fcntl is None:
+        # Only this process builds, so any other PID is left over from an earlier run
+        return pid == os.getpid()
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _refresh_in_progress():
+    """
+    True while some worker, this one included, is building a version.
+
+    Reads REFRESH_MARKER rather than probing the refresh lock, so asking never makes
+    a build that starts at the same moment skip. A build that crashed leaves its
+    marker behind; it is ignored once that process is gone.
+    """
+    try:
+        with open(REFRESH_MARKER) as f:
+            pid = int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return False
+    return _process_alive(pid)
+
+
+def garbage_collect_versions(keep=INDEX_KEEP_VERSIONS):
+    """
+    Delete old index versions, keeping the live one and the newest older ones.
+
+    Versions newer than the live one are never touched, since they may still be
+    under construction by another worker.
+
+    Returns:
+        list[str]: The versions that were removed
+    """
+    current = _read_current_version()
+    if current is None:
+        return []
+    older = sorted(
+        name for name in os.listdir(INDEX_ROOT)
+        if name < current and os.path.isdir(os.path.join(INDEX_ROOT, name))
+    )
+    stale = older[:max(0, len(older) - (keep - 1))]
+    for name in stale:
+        print(f"Removing old index version {name}")
+        shutil.rmtree(os.path.join(INDEX_ROOT, name), ignore_errors=True)
+    return stale
+
+
+def refresh_index(urls=None, pdf_dir="pdf"):
+    """
+    Build a new index version next to the live one, publish it and clean up old versions.
+
+    Queries keep being served from the live index while the build runs.
+
     Args:
-        urls: List of URLs to fetch and embed if creating a new collection
-        
+        urls: List of URLs to fetch and embed, defaults to the company pages
+        pdf_dir: Folder containing the PDF documents
+
     Returns:
-        VectorStoreRetriever: The custom retriever wrapping ChromaDB
+        str | None: The new version name, or None if another refresh is already running
     """
-    # Initialize embedding model
-    embed_model = OllamaEmbeddings(model="nomic-embed-text")
-    
-    # Check if the ChromaDB directory exists
-    if os.path.exists(CHROMA_PERSIST_DIRECTORY):
-        print(f"Loading existing ChromaDB from {CHROMA_PERSIST_DIRECTORY}")
-        # Load existing ChromaDB
+    lock_file = _acquire_refresh_lock()
+    if lock_file is None:
+        print("Index refresh already in progress, skipping")
+        return None
+    try:
+        # UTC timestamp prefix keeps versions sortable by build time, across DST changes too
+        version = f"{time.strftime('%Y%m%d%H%M%S', time.gmtime())}-{uuid.uuid4().hex[:8]}"
+        version_dir = os.path.join(INDEX_ROOT, version)
+        print(f"Building index version {version}")
+        started = time.perf_counter()
+        try:
+            # Workers load the new version themselves once it is published
+            create_new_retriever(urls=urls, pdf_dir=pdf_dir, persist_directory=version_dir).retire()
+        except Exception:
+            shutil.rmtree(version_dir, ignore_errors=True)
+            raise
+        _publish_version(version)
+        print(f"Published index version {version} in {time.perf_counter() - started:.1f}s")
+        garbage_collect_versions()
+        return version
+    finally:
+        _release_refresh_lock(lock_file)
+
+
+def start_background_refresh(urls=None, pdf_dir="pdf"):
+    """
+    Run refresh_index in a daemon thread.
+
+    Returns:
+        bool: False if a refresh is already running in this or another worker
+    """
+    if _refresh_in_progress():
+        return False
+
+    def _run():
+        try:
+            refresh_index(urls=urls, pdf_dir=pdf_dir)
+        except Exception as e:
+            print(f"Background index refresh failed: {str(e)}")
+
+    threading.Thread(target=_run, name="index-refresh", daemon=True).start()
+    return True
+
+
+def start_refresh_scheduler(interval_seconds, urls=None, pdf_dir="pdf"):
+    """
+    Periodically refresh the index in a daemon thread.
+
+    Every worker may run a scheduler; a build only starts once the live version is
+    older than the interval, and the refresh lock keeps builds from overlapping.
+    """
+    def _loop():
+        while True:
+            try:
+                age = time.time() - os.path.getmtime(CURRENT_POINTER)
+            except FileNotFoundError:
+                age = float("inf")
+            if age >= interval_seconds:
+                try:
+                    refresh_index(urls=urls, pdf_dir=pdf_dir)
+                except Exception as e:
+                    print(f"Scheduled index refresh failed: {str(e)}")
+                wait = interval_seconds
+            else:
+                wait = interval_seconds - age
+            time.sleep(max(60, wait))
+
+    thread = threading.Thread(target=_loop, name="index-refresh-scheduler", daemon=True)
+    thread.start()
+    return thread
+
+
+def index_status():
+    """Describe the live index and the versions present on disk."""
+    versions = []
+    if os.path.isdir(INDEX_ROOT):
+        versions = sorted(
+            name for name in os.listdir(INDEX_ROOT)
+            if os.path.isdir(os.path.join(INDEX_ROOT, name))
+        )
+    return {
+        "live_directory": _live_index_directory(),
+        "current_version": _read_current_version(),
+        "versions": versions,
+        "refresh_in_progress": _refresh_in_progress(),
+    }
+
+
+# Retriever for the live index, shared by all tool calls in this worker.
+# Holds (directory, retriever); replaced as a whole so readers never see a mixed state.
+# Reading it and taking a lease happen under _live_retriever_lock, so a retriever
+# cannot be retired between being handed out and being leased.
+_live_retriever = None
+_live_retriever_lock = threading.Lock()
+# Serializes loading a new version without blocking leases on the current one
+_load_lock = threading.Lock()
+# time.time() of the last inline build that did not produce a usable index
+_last_failed_inline_build = None
+
+
+def _lease_cached(directory):
+    with _live_retriever_lock:
+        cached = _live_retriever
+        if cached is not None and cached[0] == directory and cached[1].acquire():
+            return cached[1]
+    return None
+
+
+def _load_live_retriever():
+    """
+    Lease the retriever for the live index, loading it again when a new version is published.
+
+    Returns:
+        VectorStoreRetriever | None: Already acquired, so the caller must release() it.
+        None if there is no non-empty index on disk
+    """
+    global _live_retriever
+    directory = _live_index_directory()
+    retriever = _lease_cached(directory)
+    if retriever is not None or directory is None:
+        return retriever
+
+    with _load_lock:
+        directory = _live_index_directory()
+        retriever = _lease_cached(directory)
+        if retriever is not None:
+            return retriever
+
+        print(f"Loading existing ChromaDB from {directory}")
+        # Shared embedding model with a pooled keep-alive connection to Ollama
+        embed_model = ollama_embeddings()
         db = Chroma(
             collection_name=COLLECTION_NAME,
             embedding_function=embed_model,
-            persist_directory=CHROMA_PERSIST_DIRECTORY
+            persist_directory=directory
         )
-        
         # Check if collection has documents
         if db._collection.count() == 0:
-            print("Collection exists but is empty. Creating new documents...")
-            return create_new_retriever(urls = urls, embed_model = embed_model)
-        else:
-            print(f"Loaded collection with {db._collection.count()} documents")
-            return VectorStoreRetriever(db)
-    else:
-        return create_new_retriever(urls = urls, embed_model= embed_model)
-@tool
-def lookup_policy(query: str) -> str:
-    """
-    Retrieve company information with these formatting rules:
-    - No markdown or special formatting
-    - Clean paragraph structure
-    - Include source URLs
-    - Separate multiple points with line breaks
+            print("Collection exists but is empty.")
+            db._client.close()
+            return None
+        print(f"Loaded collection with {db._collection.count()} documents")
+        retriever = VectorStoreRetriever(db)
+        retriever.acquire()
+        with _live_retriever_lock:
+            previous = _live_retriever
+            _live_retriever = (directory, retriever)
+
+    # Nobody can lease the previous version any more; it is closed once its leases are released
+    if previous is not None:
+        previous[1].retire()
+    return retriever
+
+
+def _lease_retriever(urls=None):
     """
-    retriever = get_or_create_retriever()
-    retrieved_docs = retriever.query(query, k=2)
+    Lease the retriever for the live index.
+
+    If no usable index exists at all, the first version is built inline, once. If that
+    build fails, requests fail fast for INLINE_BUILD_BACKOFF seconds instead of each
+    starting another scrape-and-embed run.
     
+    Args:
+        urls: List of URLs to fetch and embed if creating a new collection
+        
+    Returns:
+        VectorStoreRetriever: The custom retriever wrapping ChromaDB, to be released by the caller
+    """
+    global _last_failed_inline_build
+    retriever = _load_live_retriever()
+    if retriever is not None:
+        return retriever
+
+    if _last_failed_inline_build is not None and time.time() - _last_failed_inline_build < INLINE_BUILD_BACKOFF:
+        raise RuntimeError("No usable index is available; the last build failed, try again later")
+
+    print("No usable index on disk. Creating new documents...")
+    try:
+        if refresh_index(urls=urls) is None:
+            # Another worker is building it; give it a moment to write its marker,
+            # then wait without holding any lock
+            time.sleep(1)
+            while _refresh_in_progress():
+                time.sleep(5)
+        retriever = _load_live_retriever()
+    except Exception:
+        _last_failed_inline_build = time.time()
+        raise
+    if retriever is None:
+        _last_failed_inline_build = time.time()
+        raise RuntimeError("No usable index is available; the index build did not produce one")
+    return retriever
+
+
+@contextmanager
+def live_retriever(urls=None):
+    """
+    Lease the retriever for the live index for the duration of the with block.
+
+    A version published meanwhile does not close the leased retriever under the caller;
+    it is closed after the last lease on it is released.
+
+    Args:
+        urls: List of URLs to fetch and embed if no index exists yet
+
+    Yields:
+        VectorStoreRetriever: The custom retriever wrapping ChromaDB
+    """
+    retriever = _lease_retriever(urls)
+    try:
+        yield retriever
+    finally:
+        retriever.release()
+
+# Number of chunks returned to the model per lookup
+LOOKUP_K = 2
+
+def format_retrieved_docs(retrieved_docs) -> str:
+    """Render retriever results the way lookup_policy returns them to the model."""
     results = []
     for doc in retrieved_docs:
         content = doc["page_content"]
@@ -189,6 +555,19 @@ def lookup_policy(query: str) -> str:
     
     return "\n".join(results) if results else "No relevant information found."
 
+@tool
+def lookup_policy(query: str) -> str:
+    """
+    Retrieve company information with these formatting rules:
+    - No markdown or special formatting
+    - Clean paragraph structure
+    - Include source URLs
+    - Separate multiple points with line breaks
+    """
+    with live_retriever() as retriever:
+        retrieved_docs = retriever.query(query, k=LOOKUP_K)
+    return format_retrieved_docs(retrieved_docs)
+
 # For testing the embedding functionality
 if __name__ == "__main__":
     # Testing the functionality of lookup_policy that we just created
@@ -0,0 +1,231 @@
+"""
+SQLite cache for the assistant's first-turn tool decisions.
+
+On the first turn of a conversation the assistant's output depends only on the
+prompt template, the user message, the model and its parameters, so identical
+first turns can reuse the lookup_policy call Groq made before. The key leaves out
+the `time` partial, so entries are shared across workers and benchmark runs.
+
+LLM_CACHE_MODE selects the behaviour:
+    off     every call goes to Groq (default)
+    cache   entries expire after LLM_CACHE_TTL seconds
+    replay  entries never expire, so benchmark runs see the same tool calls every time
+LLM_CACHE_MAX_ENTRIES bounds the table; least recently used entries are evicted first.
+
+With SPECULATIVE_MODE=inject the cache has no effect: the lookup_policy call is added
+before the first Groq call, so no first turn is left whose tool decision could be cached.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from dotenv import load_dotenv
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    convert_to_messages,
+    messages_from_dict,
+    messages_to_dict,
+)
+from langchain_core.runnables import RunnableLambda
+
+load_dotenv()
+
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "off").lower()
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+
+
+class LLMCache:
+    def __init__(self, path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        # Several workers may share the file, WAL lets readers run alongside a writer
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+        self._conn.commit()
+
+    def get(self, key, ignore_ttl=False):
+        """Return the cached AIMessage for key, or None on a miss or an expired entry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (not ignore_ttl and now - row[1] > self.ttl):
+                self._stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self._stats["hits"] += 1
+        return messages_from_dict([json.loads(row[0])])[0]
+
+    def put(self, key, message: BaseMessage):
+        now = time.time()
+        response = json.dumps(messages_to_dict([message])[0])
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, response, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            self._stats["stores"] += 1
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        evicted = 0
+        if LLM_CACHE_MODE != "replay":
+            evicted += self._conn.execute(
+                "DELETE FROM llm_cache WHERE created < ?", (now - self.ttl,)
+            ).rowcount
+        evicted += self._conn.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            " SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        ).rowcount
+        self._stats["evictions"] += evicted
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["mode"] = LLM_CACHE_MODE
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+
+def _canonical_message(message: BaseMessage):
+    # Message ids are assigned per conversation, so they stay out of the key
+    canonical = {"type": message.type, "content": message.content}
+    if isinstance(message, AIMessage) and message.tool_calls:
+        canonical["tool_calls"] = [{"name": tc["name"], "args": tc["args"]} for tc in message.tool_calls]
+    return canonical
+
+
+def _template_fingerprint(prompt):
+    """The prompt's message templates, unrendered, so partials like `time` stay out of the key."""
+    return [
+        getattr(getattr(message, "prompt", None), "template", None) or repr(message)
+        for message in prompt.messages
+    ]
+
+
+def cache_key(prompt, variables, messages, params):
+    """
+    Hash of what decides the first turn: prompt template, prompt variables from the
+    state (user_info), conversation messages, model and parameters.
+
+    The rendered prompt is not hashed. It contains the `time` partial, which differs
+    per process and would keep entries from being shared across workers and runs.
+    """
+    payload = json.dumps(
+        {
+            "template": _template_fingerprint(prompt),
+            "variables": variables,
+            "messages": [_canonical_message(m) for m in messages],
+            "params": params,
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _with_fresh_tool_call_ids(message):
+    """Copy of a cached AIMessage whose tool calls get new ids, as a live Groq response would."""
+    ids = {call["id"]: f"call_{uuid.uuid4().hex}" for call in message.tool_calls}
+    additional_kwargs = dict(message.additional_kwargs)
+    if "tool_calls" in additional_kwargs:
+        additional_kwargs["tool_calls"] = [
+            {**call, "id": ids.get(call.get("id"), call.get("id"))} for call in additional_kwargs["tool_calls"]
+        ]
+    return message.model_copy(update={
+        "tool_calls": [{**call, "id": ids[call["id"]]} for call in message.tool_calls],
+        "additional_kwargs": additional_kwargs,
+    })
+
+
+def is_first_turn(messages):
+    """True while the model has not answered yet, i.e. only system and user messages so far."""
+    return all(message.type in ("system", "human") for message in messages)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+        return _cache
+
+
+def cache_stats():
+    if LLM_CACHE_MODE == "off":
+        return {"mode": LLM_CACHE_MODE}
+    return get_cache().stats()
+
+
+def cached_tool_decisions(prompt, runnable, params):
+    """
+    Chain a prompt and a tool-bound chat model, serving first-turn tool calls from the cache.
+
+    Args:
+        prompt: The ChatPromptTemplate rendered from the graph state
+        runnable: The chat model with tools bound, invoked with the rendered prompt
+        params: Model name and generation parameters, part of the cache key
+
+    Returns:
+        prompt | runnable when caching is off, otherwise a caching equivalent
+    """
+    if LLM_CACHE_MODE not in ("cache", "replay"):
+        return prompt | runnable
+    # Tool schemas are part of what the model decides on
+    params = {**params, "tools": getattr(runnable, "kwargs", {}).get("tools")}
+
+    def _invoke(state, config):
+        messages = convert_to_messages(state["messages"])
+        if not is_first_turn(messages):
+            return runnable.invoke(prompt.invoke(state, config), config)
+        cache = get_cache()
+        variables = {name: value for name, value in state.items() if name != "messages"}
+        key = cache_key(prompt, variables, messages, params)
+        cached = cache.get(key, ignore_ttl=LLM_CACHE_MODE == "replay")
+        if cached is not None:
+            # No tokens were spent on this call, and add_messages assigns a fresh id. Tool call
+            # ids are replaced too, so conversations served from one entry never share them.
+            return _with_fresh_tool_call_ids(cached).model_copy(update={
+                "id": None,
+                "usage_metadata": None,
+                "response_metadata": {**cached.response_metadata, "llm_cache_hit": True},
+            })
+        result = runnable.invoke(prompt.invoke(state, config), config)
+        # Only tool decisions are stored; a direct answer is left to the model each time
+        if result.tool_calls:
+            cache.put(key, result)
+        return result
+
+    return RunnableLambda(_invoke, name="cached_tool_decisions")
@@ -1,7 +1,8 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
+import os
 import uuid
 from datetime import datetime
 
@@ -9,6 +10,14 @@ from datetime import datetime
 from langchain_core.messages import HumanMessage
 from langchain_core.runnables import RunnableConfig
 import groqs as main  # This imports your Python file
+import http_clients
+import langembedding
+import llm_cache
+
+# Admin endpoints are disabled unless a token is configured
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Optional periodic index rebuild, in hours
+INDEX_REFRESH_INTERVAL_HOURS = os.getenv("INDEX_REFRESH_INTERVAL_HOURS")
 
 app = FastAPI()
 
@@ -75,6 +84,48 @@ async def chat(request: ChatRequest):
         print(f"Error processing chat request: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _require_admin(token: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    if token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@app.on_event("startup")
+async def start_index_scheduler():
+    if INDEX_REFRESH_INTERVAL_HOURS:
+        langembedding.start_refresh_scheduler(float(INDEX_REFRESH_INTERVAL_HOURS) * 3600)
+
+@app.post("/api/admin/refresh-index", status_code=202)
+async def refresh_index(x_admin_token: Optional[str] = Header(None)):
+    _require_admin(x_admin_token)
+    # The build runs in the background; queries keep using the live index until it is swapped
+    started = langembedding.start_background_refresh()
+    return {"started": started, **langembedding.index_status()}
+
+@app.get("/api/admin/index-status")
+async def index_status(x_admin_token: Optional[str] = Header(None)):
+    _require_admin(x_admin_token)
+    return langembedding.index_status()
+
+@app.get("/api/admin/speculation-stats")
+async def speculation_stats(x_admin_token: Optional[str] = Header(None)):
+    _require_admin(x_admin_token)
+    return main.speculation_stats()
+
+@app.get("/api/admin/http-stats")
+async def http_stats(x_admin_token: Optional[str] = Header(None)):
+    _require_admin(x_admin_token)
+    return http_clients.connection_stats()
+
+@app.get("/api/admin/llm-cache-stats")
+async def llm_cache_stats(x_admin_token: Optional[str] = Header(None)):
+    _require_admin(x_admin_token)
+    return llm_cache.cache_stats()
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    await http_clients.aclose_clients()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=9000)